@@ -3,16 +3,193 @@
 # - For Windows Pipe: pip install pywin32
 # - For BLE (optional): pip install bleak
 # - For USB Serial (optional): pip install pyserial
+# - For faster JSON parsing (optional): pip install pysimdjson or orjson
 
 from abc import ABC, abstractmethod
+import asyncio
+import collections
+import logging
+import threading
 import time
 import json
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, Iterator, Sequence
+
+# Transport errors go through logging with deferred %-formatting, so error
+# bursts (e.g. during reconnection churn) cost little when filtered out.
+# Per-frame parse errors are logged at DEBUG; connection failures at WARNING.
+_log = logging.getLogger(__name__)
+
+# JSON decoding, fastest available first. Every backend takes the raw frame
+# bytes, so no intermediate str is built; the stdlib parser is the fallback.
+# A simdjson Parser reuses its internal buffers across frames but must not be
+# shared between threads, so each transport owns one from _new_parser() and
+# passes it to the helpers below (the fallbacks ignore it).
+#
+# _loads_keys() returns only the requested fields, given as JSON Pointer paths
+# without the leading slash, such as "sticks" or "buttons/A" (array indices
+# and ~0/~1 escapes work too); missing fields map to None. With
+# simdjson the rest of the document is never turned into Python objects.
+try:
+    import simdjson
+    _DecodeError = ValueError
+
+    def _new_parser():
+        return simdjson.Parser()
+
+    def _loads(data, parser):
+        return parser.parse(data, True)  # Plain Python objects for any document
+
+    def _loads_keys(data, keys, parser):
+        doc = parser.parse(data)
+        if not isinstance(doc, (simdjson.Object, simdjson.Array)):
+            return dict.fromkeys(keys)  # Scalar document has no fields
+        out = {}
+        for key in keys:
+            try:
+                value = doc.at_pointer("/" + key)
+            except (KeyError, IndexError, TypeError, ValueError):
+                # Missing field, bad index, wrong container type or bad pointer
+                # syntax; the document itself already parsed.
+                value = None
+            if isinstance(value, simdjson.Object):
+                value = value.as_dict()
+            elif isinstance(value, simdjson.Array):
+                value = value.as_list()
+            out[key] = value
+        return out
+except ImportError:
+    _DecodeError = json.JSONDecodeError
+    try:
+        import orjson
+        _decode = orjson.loads
+    except ImportError:
+        _decode = json.loads  # Accepts UTF-8 bytes directly
+
+    def _new_parser():
+        return None
+
+    def _loads(data, parser=None):
+        return _decode(data)
+
+    def _loads_keys(data, keys, parser=None):
+        doc = _decode(data)
+        out = {}
+        for key in keys:
+            value = doc
+            # Same JSON Pointer rules simdjson's at_pointer applies: ~1 is "/",
+            # ~0 is "~", and array elements are addressed by decimal index.
+            for part in key.split("/"):
+                part = part.replace("~1", "/").replace("~0", "~")
+                if isinstance(value, dict):
+                    value = value.get(part)
+                elif (isinstance(value, list) and part.isdigit()
+                        and (part == "0" or part[0] != "0") and int(part) < len(value)):
+                    value = value[int(part)]
+                else:
+                    value = None
+                    break
+            out[key] = value
+        return out
+
+# pywin32 is only needed by the named pipe transport; imported once here so the
+# hot read path doesn't repeat the import on every call.
+try:
+    import win32event
+    import win32file
+    import win32pipe
+    import pywintypes
+    import winerror
+    _ReadFile = win32file.ReadFile
+    _PywinError = pywintypes.error
+except ImportError:
+    win32event = win32file = win32pipe = pywintypes = winerror = None
+    _ReadFile = None
+    _PywinError = None
+
+# Access right SetNamedPipeHandleState needs on the client handle
+_FILE_WRITE_ATTRIBUTES = 0x0100
+
+# Upper bound on each wait for incoming data. Reads complete as soon as bytes
+# arrive; the timeout only keeps Ctrl+C responsive while the link is idle.
+_READ_WAIT_MS = 100
+
+# Fixed-size line buffer used by stream transports
+class _LineRing:
+    """Circular byte buffer that hands back newline-delimited lines.
+
+    Reads land directly in the free space at the head (see reserve/commit)
+    and lines are consumed from the tail, so taking a frame never shifts the
+    remaining data and no per-read buffer is allocated.
+    """
+    
+    __slots__ = ("_buf", "_view", "_cap", "_head", "_tail", "_size", "_scanned")
+    
+    def __init__(self, capacity: int = 65536):
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._cap = capacity
+        self._head = 0  # Next write position
+        self._tail = 0  # Start of unconsumed data
+        self._size = 0  # Bytes currently held
+        self._scanned = 0  # Leading held bytes already known to contain no newline
+    
+    def reserve(self) -> memoryview:
+        """Writable view of the contiguous free space at the head (empty if full)"""
+        head, tail = self._head, self._tail
+        if self._size and head <= tail:
+            return self._view[head:tail]
+        return self._view[head:]
+    
+    def commit(self, n: int) -> None:
+        """Mark n bytes written into the last reserved view as held data"""
+        self._head = (self._head + n) % self._cap
+        self._size += n
+    
+    def pop_line(self) -> Optional[bytes]:
+        """Remove and return the next line without its newline, or None if incomplete"""
+        if self._scanned == self._size:
+            return None  # Nothing new since the last search
+        buf, view, cap, tail = self._buf, self._view, self._cap, self._tail
+        # Single find() per region, resuming where the previous search stopped
+        # so a partial line is never rescanned while it accumulates.
+        start = tail + self._scanned
+        end = tail + self._size
+        if end <= cap:
+            nl = buf.find(b"\n", start, end)
+            if nl < 0:
+                self._scanned = self._size
+                return None
+            line = bytes(view[tail:nl])
+        else:
+            # Held data wraps: search to the end of the ring, then from the start
+            nl = buf.find(b"\n", start, cap) if start < cap else -1
+            if nl >= 0:
+                line = bytes(view[tail:nl])
+            else:
+                nl = buf.find(b"\n", max(start - cap, 0), end - cap)
+                if nl < 0:
+                    self._scanned = self._size
+                    return None
+                line = bytes(view[tail:]) + bytes(view[:nl])
+        self._scanned = 0
+        consumed = (nl - tail) % cap + 1
+        self._size -= consumed
+        if self._size:
+            self._tail = (tail + consumed) % cap
+        else:
+            self._head = self._tail = 0  # Empty; rewind to limit wrapping
+        return line
+    
+    def clear(self) -> None:
+        self._head = self._tail = self._size = self._scanned = 0
 
 # Transport base class
 class ControllerTransport(ABC):
     """Abstract base class defining the interface for all transport methods"""
     
+    # Empty so subclasses that declare __slots__ get no per-instance __dict__
+    __slots__ = ()
+    
     @abstractmethod
     def connect(self) -> bool:
         """Establish connection with the controller reader"""
@@ -28,6 +205,26 @@ class ControllerTransport(ABC):
         """Read one controller state update, returns parsed JSON or None if no data"""
         pass
     
+    def close(self) -> None:
+        """Disconnect and release any resources held for the transport's lifetime"""
+        self.disconnect()
+    
+    def read_states(self) -> Iterator[Dict[str, Any]]:
+        """Yield controller state updates until the transport disconnects.
+
+        Transports that can deliver several frames per read should override
+        this to drain them in one pass.
+        """
+        while self.is_connected:
+            state = self.read_state()
+            if state:
+                yield state
+    
+    def run(self, on_state: Callable[[Dict[str, Any]], None]) -> None:
+        """Pass every state update to on_state until the transport disconnects"""
+        for state in self.read_states():
+            on_state(state)
+    
     @property
     @abstractmethod
     def is_connected(self) -> bool:
@@ -36,73 +233,233 @@ class ControllerTransport(ABC):
 
 # Windows Named Pipe Transport
 class WindowsPipeTransport(ControllerTransport):
-    """Windows Named Pipe implementation of the controller transport"""
+    """Windows Named Pipe implementation of the controller transport
+    
+    A background thread owns the pipe handle's reads: it waits on overlapped
+    ReadFile (which releases the GIL), parses frames and queues them, so the
+    consumer only pops ready states.
+    """
     
-    def __init__(self, pipe_name: str = r"\\.\pipe\XboxReaderPipe"):
-        import win32file
-        import win32pipe
-        import pywintypes
+    # Fixed attribute slots: cheaper access on the per-frame path, no __dict__
+    __slots__ = (
+        "_pipe_name", "_keys", "_parser", "_handle", "_buffer", "_ovl", "_rbuf",
+        "_pending", "_message_mode", "_queue", "_ready", "_stop", "_thread",
+    )
+    
+    def __init__(self, pipe_name: str = r"\\.\pipe\XboxReaderPipe",
+                 keys: Optional[Sequence[str]] = None):
+        if win32file is None:
+            raise ImportError("WindowsPipeTransport requires pywin32 (pip install pywin32)")
         
         self._pipe_name = pipe_name
+        self._keys = tuple(keys) if keys else None  # Fields to extract, None for all
+        self._parser = _new_parser()  # Per transport; parsers aren't thread-safe
         self._handle = None
-        self._buffer = b""
+        self._buffer = _LineRing()
+        self._ovl = None  # OVERLAPPED for the in-flight read
+        self._rbuf = None  # Ring view the in-flight read fills
+        self._pending = False  # True while a ReadFile is outstanding
+        self._message_mode = False  # One frame per read; no line framing
+        # Reader thread -> consumer handoff. deque append/popleft are atomic,
+        # so a single producer and consumer need no lock; when full the oldest
+        # state is dropped in favour of the newest.
+        self._queue = collections.deque(maxlen=256)
+        self._ready = threading.Event()  # Set whenever a state is queued
+        self._stop = threading.Event()
+        self._thread = None
     
     def connect(self) -> bool:
-        import win32file
-        import pywintypes
-        
+        handle = None
         try:
-            self._handle = win32file.CreateFile(
-                self._pipe_name,
-                win32file.GENERIC_READ,
-                0,
-                None,
-                win32file.OPEN_EXISTING,
-                0,
-                None
-            )
+            # Returns as soon as a pipe instance is free; raises straight away
+            # if the server hasn't created the pipe yet.
+            win32pipe.WaitNamedPipe(self._pipe_name, win32pipe.NMPWAIT_USE_DEFAULT_WAIT)
+            can_set_mode = True
+            try:
+                handle = self._open(win32file.GENERIC_READ | _FILE_WRITE_ATTRIBUTES)
+            except _PywinError as e:
+                if e.winerror != winerror.ERROR_ACCESS_DENIED:
+                    raise
+                # The default pipe DACL only grants Everyone read access, e.g.
+                # when the producer runs elevated or as another account. Open
+                # read-only and stay in byte mode.
+                handle = self._open(win32file.GENERIC_READ)
+                can_set_mode = False
+            # Overlapped reads signal this event when data arrives, so the
+            # reader blocks in the kernel instead of sleeping and polling.
+            self._ovl = pywintypes.OVERLAPPED()
+            self._ovl.hEvent = win32event.CreateEvent(None, True, False, None)
+            self._pending = False
+            # Message-mode reads return exactly one frame each, so no line
+            # framing is needed. A producer that created a byte-type pipe
+            # rejects this; fall back to splitting the stream on newlines.
+            self._message_mode = False
+            if can_set_mode:
+                try:
+                    win32pipe.SetNamedPipeHandleState(
+                        handle, win32pipe.PIPE_READMODE_MESSAGE, None, None
+                    )
+                    self._message_mode = True
+                except _PywinError:
+                    pass
+            self._buffer.clear()
+            self._queue.clear()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._pump, name="PipeReader", daemon=True)
+            # Publish the handle only once setup has worked; the reader uses it
+            self._handle = handle
+            self._thread.start()
             return True
-        except pywintypes.error:
-            return False
+        except _PywinError:
+            pass
         except Exception as e:
-            print(f"Pipe connection error: {e}")
-            return False
+            _log.warning("Pipe connection error: %s", e)
+        # Setup failed part way: don't leak the handle or look connected
+        self._handle = None
+        self._thread = None
+        if handle is not None:
+            try:
+                win32file.CloseHandle(handle)
+            except _PywinError:
+                pass
+        return False
+
+    def _open(self, access: int):
+        return win32file.CreateFile(
+            self._pipe_name,
+            access,
+            0,
+            None,
+            win32file.OPEN_EXISTING,
+            win32file.FILE_FLAG_OVERLAPPED,
+            None
+        )
 
     def disconnect(self) -> None:
-        import win32file
-        
         if self._handle:
             try:
+                # The reader thread notices within one read wait and cancels
+                # its own outstanding read before exiting.
+                self._stop.set()
+                if self._thread is not None and self._thread is not threading.current_thread():
+                    self._thread.join()
                 win32file.CloseHandle(self._handle)
             except Exception as e:
-                print(f"Pipe disconnect error: {e}")
+                _log.warning("Pipe disconnect error: %s", e)
             finally:
                 self._handle = None
+                self._thread = None
+                self._queue.clear()
     
     def read_state(self) -> Optional[Dict[str, Any]]:
-        import win32file
-        import pywintypes
-        
         if not self.is_connected:
             return None
-            
+        
         try:
-            hr, data = win32file.ReadFile(self._handle, 4096, None)
-            if not data:
-                time.sleep(0.05)  # No data available, small delay
-                return None
-                
-            self._buffer += data
-            if b"\n" in self._buffer:
-                line, self._buffer = self._buffer.split(b"\n", 1)
+            return self._queue.popleft()
+        except IndexError:
+            if not self._thread.is_alive():
+                self.disconnect()  # Reader stopped on a pipe error
+            return None
+    
+    def read_states(self) -> Iterator[Dict[str, Any]]:
+        queue, ready = self._queue, self._ready
+        while self.is_connected:
+            # Clear before checking so a state queued in between still wakes us
+            ready.clear()
+            while queue:
+                yield queue.popleft()
+            if not self._thread.is_alive():
+                self.disconnect()  # Reader stopped on a pipe error
+                return
+            ready.wait(_READ_WAIT_MS / 1000)
+    
+    def _pump(self) -> None:
+        """Reader thread body: queue every state parsed from the pipe"""
+        try:
+            for state in self._read_pipe():
+                self._queue.append(state)
+                self._ready.set()
+        except Exception:
+            _log.exception("Pipe reader stopped on unexpected error")
+        finally:
+            if self._pending:
+                # CancelIo only cancels this thread's I/O, so it must run here.
+                # The kernel still owns the OVERLAPPED; wait for the read to settle.
+                try:
+                    win32file.CancelIo(self._handle)
+                    win32file.GetOverlappedResult(self._handle, self._ovl, True)
+                except _PywinError:
+                    pass
+                self._pending = False
+                self._rbuf = None
+            self._ready.set()  # Wake the consumer so it sees the reader exit
+    
+    def _parse(self, frame: bytes) -> Optional[Dict[str, Any]]:
+        try:
+            if self._keys:
+                return _loads_keys(frame, self._keys, self._parser)
+            return _loads(frame, self._parser)
+        except (UnicodeDecodeError, _DecodeError) as e:
+            _log.debug("Data parsing error: %s", e)
+            return None
+    
+    def _read_pipe(self) -> Iterator[Dict[str, Any]]:
+        ring = self._buffer
+        discarding = False  # Skipping the rest of an oversized message
+        while not self._stop.is_set():
+            # Yield every complete line already buffered before blocking on
+            # the next read; one ReadFile can deliver many frames. (In message
+            # mode the ring never holds data, so this finds nothing.)
+            line = ring.pop_line()
+            while line is not None:
                 if line:
-                    return json.loads(line.decode("utf-8"))
-        except pywintypes.error as e:
-            print(f"Pipe read error: {e}")
-            self.disconnect()  # Ensure cleanup on error
-        except (UnicodeDecodeError, json.JSONDecodeError) as e:
-            print(f"Data parsing error: {e}")
-        return None
+                    state = self._parse(line)
+                    if state is not None:
+                        yield state
+                line = ring.pop_line()
+            
+            try:
+                if not self._pending:
+                    # Read straight into the ring's free space (no copy). In
+                    # message mode the ring is always empty, so this is the
+                    # whole 64 KiB and each frame is copied out of it once.
+                    self._rbuf = ring.reserve()
+                    if not self._rbuf:
+                        # A full ring with no newline can't hold a valid frame
+                        _log.debug("Data parsing error: line exceeds buffer, discarding")
+                        ring.clear()
+                        self._rbuf = ring.reserve()
+                    _ReadFile(self._handle, self._rbuf, self._ovl)
+                    self._pending = True
+                if win32event.WaitForSingleObject(self._ovl.hEvent, _READ_WAIT_MS) == win32event.WAIT_TIMEOUT:
+                    continue  # Read stays posted; wait on it again
+                self._pending = False
+                n = win32file.GetOverlappedResult(self._handle, self._ovl, False)
+            except _PywinError as e:
+                self._pending = False
+                if self._message_mode and e.winerror == winerror.ERROR_MORE_DATA:
+                    # Message larger than the read view can't be a valid frame;
+                    # drop it and the reads that return its remainder.
+                    if not discarding:
+                        _log.debug("Data parsing error: message exceeds buffer, discarding")
+                    discarding = True
+                    self._rbuf = None
+                    continue
+                _log.warning("Pipe read error: %s", e)
+                return  # Consumer sees the thread exit and disconnects
+            if self._message_mode:
+                frame = bytes(self._rbuf[:n])
+                self._rbuf = None
+                if discarding:
+                    discarding = False  # Final chunk of the oversized message
+                elif frame:
+                    state = self._parse(frame)
+                    if state is not None:
+                        yield state
+            else:
+                self._rbuf = None
+                ring.commit(n)
             
     @property
     def is_connected(self) -> bool:
@@ -112,57 +469,95 @@ class WindowsPipeTransport(ControllerTransport):
 class BLETransport(ControllerTransport):
     """Bluetooth LE implementation of the controller transport"""
     
-    def __init__(self, service_uuid: str, characteristic_uuid: str):
+    __slots__ = (
+        "_service_uuid", "_char_uuid", "_keys", "_parser", "_device",
+        "_characteristic", "_loop", "_frames", "_waiter",
+    )
+    
+    def __init__(self, service_uuid: str, characteristic_uuid: str,
+                 keys: Optional[Sequence[str]] = None):
         self._service_uuid = service_uuid
         self._char_uuid = characteristic_uuid
+        self._keys = tuple(keys) if keys else None  # Fields to extract, None for all
+        self._parser = _new_parser()  # Per transport; parsers aren't thread-safe
         self._device = None
         self._characteristic = None
+        # One loop for the transport's lifetime; asyncio.run() would build and
+        # tear down a new loop on every call.
+        self._loop = asyncio.new_event_loop()
+        self._frames = collections.deque(maxlen=256)  # Notified payloads
+        self._waiter = None  # Future read_state() waits on for the next frame
         
     def connect(self) -> bool:
         try:
             # Bleak is imported here to make it an optional dependency
-            import asyncio
             from bleak import BleakClient, BleakScanner
             
             # Scan for devices advertising our service
-            device = asyncio.run(BleakScanner.find_device_by_filter(
+            device = self._loop.run_until_complete(BleakScanner.find_device_by_filter(
                 lambda d, ad: self._service_uuid in ad.service_uuids if ad.service_uuids else False
             ))
             
             if not device:
                 return False
                 
-            # Connect and get characteristic
+            # Connect and subscribe; frames are pushed to us as they arrive
             self._device = BleakClient(device.address)
-            asyncio.run(self._device.connect())
+            self._loop.run_until_complete(self._device.connect())
             self._characteristic = self._char_uuid
+            self._loop.run_until_complete(
+                self._device.start_notify(self._characteristic, self._on_notify)
+            )
             return True
         except Exception as e:
-            print(f"BLE connection error: {e}")
-            self._device = None
+            _log.warning("BLE connection error: %s", e)
+            if self._device is not None:
+                self.disconnect()  # Don't strand a half-set-up connection
             return False
             
     def disconnect(self) -> None:
         if self._device:
             try:
-                import asyncio
-                asyncio.run(self._device.disconnect())
+                self._loop.run_until_complete(self._device.disconnect())
             except Exception as e:
-                print(f"BLE disconnect error: {e}")
+                _log.warning("BLE disconnect error: %s", e)
             finally:
                 self._device = None
+                self._frames.clear()
+    
+    def close(self) -> None:
+        self.disconnect()
+        if not self._loop.is_closed():
+            self._loop.close()
+    
+    def _on_notify(self, _sender, data: bytearray) -> None:
+        # Runs on self._loop while read_state() is driving it
+        self._frames.append(data)
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
             
     def read_state(self) -> Optional[Dict[str, Any]]:
         if not self.is_connected:
             return None
             
         try:
-            import asyncio
-            # Read notification data from BLE characteristic
-            data = asyncio.run(self._device.read_gatt_char(self._characteristic))
-            return json.loads(data.decode("utf-8"))
+            if not self._frames:
+                # Run the loop until a notification lands or the wait times out
+                self._waiter = self._loop.create_future()
+                try:
+                    self._loop.run_until_complete(
+                        asyncio.wait_for(self._waiter, _READ_WAIT_MS / 1000)
+                    )
+                except asyncio.TimeoutError:
+                    return None
+                finally:
+                    self._waiter = None
+            data = self._frames.popleft()
+            if self._keys:
+                return _loads_keys(data, self._keys, self._parser)
+            return _loads(data, self._parser)
         except Exception as e:
-            print(f"BLE read error: {e}")
+            _log.warning("BLE read error: %s", e)
             self.disconnect()  # Ensure cleanup on error
             return None
             
@@ -170,27 +565,27 @@ class BLETransport(ControllerTransport):
     def is_connected(self) -> bool:
         return self._device is not None and self._device.is_connected
 
-def main():
-    # Create the appropriate transport
-    transport = WindowsPipeTransport()
+def main(transport: Optional[ControllerTransport] = None):
+    # Default to the Windows named pipe when no transport is given
+    if transport is None:
+        transport = WindowsPipeTransport()
     
     print("Waiting for Xbox Controller connection... (will retry until connected)")
     
-    # Try to connect until successful
+    # Try to connect until successful, backing off from 5 ms up to 300 ms
+    delay = 0.005
     while not transport.connect():
-        time.sleep(0.3)
+        time.sleep(delay)
+        delay = min(delay * 2, 0.3)
     
     print(f"Connected successfully!")
     
     try:
-        while True:
-            state = transport.read_state()
-            if state:
-                print("Controller state:", state)
+        transport.run(lambda state: print("Controller state:", state))
     except KeyboardInterrupt:
         print("\nShutting down...")
     finally:
-        transport.disconnect()
+        transport.close()
 
 if __name__ == "__main__":
     # Example of how to use different transports:
@@ -209,4 +604,4 @@ if __name__ == "__main__":
     # - Network Socket Transport
     # - etc.
     
-    main()
+    main(transport)
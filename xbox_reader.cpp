@@ -39,6 +39,9 @@ SOFTWARE.
   Notes
   -----
   - The pipe sends *textual JSON* encoded in UTF-8, each snapshot followed by a newline.
+  - The pipe is message-type: each snapshot (with its newline) is one message, so clients
+    in message read mode get exactly one snapshot per read. Byte-mode clients can still
+    split the stream on newlines.
   - The UI is double-buffered: the whole frame is built into a string then written in one call to avoid flicker.
 */
 
@@ -373,7 +376,7 @@ static void PipeThread()
         HANDLE hPipe = CreateNamedPipeA(
             kPipeName,
             PIPE_ACCESS_OUTBOUND,
-            PIPE_TYPE_BYTE | PIPE_READMODE_BYTE | PIPE_WAIT,
+            PIPE_TYPE_MESSAGE | PIPE_READMODE_MESSAGE | PIPE_WAIT,
             1,
             16*1024,
             16*1024,
@@ -401,12 +404,10 @@ static void PipeThread()
                 std::string snapshot = g_latestJson;
                 lk.unlock();
 
+                // Single write so the snapshot and its newline form one pipe message
+                snapshot += '\n';
                 DWORD written;
                 BOOL ok = WriteFile(hPipe, snapshot.data(), (DWORD)snapshot.size(), &written, nullptr);
-                if (ok) {
-                    const char nl = '\n';
-                    ok = WriteFile(hPipe, &nl, 1, &written, nullptr);
-                }
 
                 if (!ok) {
                     WRITE_CONSOLE("Client disconnected.\n");